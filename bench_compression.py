@@ -0,0 +1,142 @@
+# bench_compression.py
+# Purpose: Measure the I/O-versus-CPU trade-off of storing the corpus plain, as gzip
+# or as xz. Every file from a source folder (default: data/raw) is rewritten with
+# each codec into a temporary folder, then streamed back the way the pipeline
+# reads it. Reports on-disk size, wall time and CPU time for writing and reading.
+# Written files are fsynced and, before every read pass, evicted from the page cache
+# (posix_fadvise DONTNEED) so reads hit the disk; --warm skips the eviction.
+#
+#   python bench_compression.py --src-dir data/raw --work-dir data
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from compressed_io import codec_suffix, is_text_file, iter_text_chunks, one_per_variant, open_text, strip_text_suffix
+
+def load_corpus(src_dir: str):
+    """Return [(name, text)] for every (possibly compressed) text file in src_dir."""
+    files = one_per_variant(sorted(os.path.join(src_dir, fn) for fn in os.listdir(src_dir) if is_text_file(fn)))
+    corpus = []
+    for fp in files:
+        with open_text(fp, "r") as f:
+            corpus.append((strip_text_suffix(fp), f.read()))
+    return corpus
+
+def evict_from_cache(paths) -> bool:
+    """Drop the files' pages from the OS page cache; False where posix_fadvise is unavailable."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)  # only clean pages can be dropped
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+def bench_codec(corpus, codec: str, work_dir: str, level=None, repeat: int = 3, cold: bool = True) -> dict:
+    suffix = codec_suffix(codec)
+    paths = []
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    for i, (name, text) in enumerate(corpus):
+        path = os.path.join(work_dir, f"{i:05d}_{name}.txt{suffix}")
+        with open_text(path, "w", errors="strict", level=level) as f:
+            f.write(text)
+        # include the flush to disk in the write time
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        paths.append(path)
+    write_wall = time.perf_counter() - wall0
+    write_cpu = time.process_time() - cpu0
+
+    # Reads are repeated and the best run kept; cold runs evict the files before each pass
+    read_wall = read_cpu = float("inf")
+    for _ in range(repeat):
+        if cold:
+            evict_from_cache(paths)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        n_chars = 0
+        for path in paths:
+            for chunk in iter_text_chunks(path):
+                n_chars += len(chunk)
+        read_wall = min(read_wall, time.perf_counter() - wall0)
+        read_cpu = min(read_cpu, time.process_time() - cpu0)
+
+    on_disk = sum(os.path.getsize(p) for p in paths)
+    for p in paths:
+        os.remove(p)
+
+    return {
+        "codec": codec or "none",
+        "bytes": on_disk,
+        "write_wall": write_wall,
+        "write_cpu": write_cpu,
+        "read_wall": read_wall,
+        "read_cpu": read_cpu,
+        "chars": n_chars,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plain vs gzip vs xz storage for the corpus.")
+    parser.add_argument("--src-dir", type=str, default="data/raw",
+                        help="Folder with .txt / .txt.gz / .txt.xz files (data/raw or data/clean).")
+    parser.add_argument("--codecs", nargs="+", default=["none", "gz", "xz"],
+                        help="Codecs to compare.")
+    parser.add_argument("--level", type=int, default=None,
+                        help="gzip compresslevel / xz preset (default: codec default).")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Read passes per codec (best is reported).")
+    parser.add_argument("--work-dir", type=str, default="data",
+                        help="Where the test files are written (keep it on the same disk as data/).")
+    parser.add_argument("--warm", action="store_true",
+                        help="Do not evict test files from the page cache before reading (CPU cost only).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.src_dir):
+        raise SystemExit(f"Source folder not found: {args.src_dir}. Run the crawler first.")
+    corpus = load_corpus(args.src_dir)
+    if not corpus:
+        raise SystemExit(f"No text files found under {args.src_dir}.")
+
+    raw_bytes = sum(len(text.encode("utf-8")) for _, text in corpus)
+    print(f"[INFO] {len(corpus)} files, {raw_bytes / 1e6:.1f} MB of UTF-8 text from {args.src_dir}")
+
+    cold = not args.warm
+    if cold and not hasattr(os, "posix_fadvise"):
+        print("[WARN] posix_fadvise is not available here; reads will come from the page cache.")
+        cold = False
+
+    results = []
+    os.makedirs(args.work_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="bench_compression_", dir=args.work_dir) as work_dir:
+        print(f"[INFO] Test files under {work_dir} ({'cold' if cold else 'warm'} page cache)")
+        for codec in args.codecs:
+            print(f"[INFO] Benchmarking codec: {codec}")
+            results.append(bench_codec(corpus, codec, work_dir, level=args.level, repeat=args.repeat, cold=cold))
+
+    print()
+    print(f"{'codec':<6} {'size MB':>9} {'ratio':>6} {'write s':>8} {'w-cpu s':>8} "
+          f"{'read s':>8} {'r-cpu s':>8} {'read MB/s':>10}")
+    for r in results:
+        ratio = raw_bytes / r["bytes"] if r["bytes"] else float("nan")
+        mbps = raw_bytes / 1e6 / r["read_wall"] if r["read_wall"] > 0 else float("inf")
+        print(f"{r['codec']:<6} {r['bytes'] / 1e6:>9.2f} {ratio:>6.2f} {r['write_wall']:>8.3f} "
+              f"{r['write_cpu']:>8.3f} {r['read_wall']:>8.3f} {r['read_cpu']:>8.3f} {mbps:>10.1f}")
+    print("\nread MB/s is uncompressed text throughput; when read s >> r-cpu s the run is I/O-bound.")
+    if not cold:
+        print("Reads were served from the page cache, so they show CPU cost only.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
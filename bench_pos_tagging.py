@@ -0,0 +1,98 @@
+# bench_pos_tagging.py
+# Purpose: Compare POS tagging + lemmatization throughput of the old whole-book
+# nltk.pos_tag call against the batched tagger in clean_and_vocab.py, for several
+# batch sizes. Also reports peak Python memory (tracemalloc) and how many lemmas
+# differ from the whole-book run (batch edges give the tagger a fresh context).
+#
+#   python bench_pos_tagging.py --raw-dir data/raw --books 3 --batch-sizes 500 2000 5000 20000
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+from nltk import pos_tag, word_tokenize
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+import clean_and_vocab as cv
+from compressed_io import is_text_file, open_text
+
+def whole_book_lemmas(text: str) -> list:
+    """The previous implementation: one pos_tag call over the whole book."""
+    tokens = word_tokenize(text, preserve_line=True)
+    tokens = [t.lower() for t in tokens if t.isalpha()]
+    tagged = pos_tag(tokens)
+
+    lemmatizer = WordNetLemmatizer()
+    stop = set(stopwords.words("english"))
+    lemmas = []
+    for tok, tg in tagged:
+        if tok in stop:
+            continue
+        lemma = lemmatizer.lemmatize(tok, pos=cv.nltk_pos_to_wordnet_pos(tg))
+        if lemma and lemma not in stop:
+            lemmas.append(lemma)
+    return lemmas
+
+def measure(fn, texts, with_memory: bool):
+    if with_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    lemmas = [fn(text) for text in texts]
+    elapsed = time.perf_counter() - t0
+    peak = 0
+    if with_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return lemmas, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark whole-book vs batched POS tagging.")
+    parser.add_argument("--raw-dir", type=str, default="data/raw", help="Folder of raw Gutenberg texts.")
+    parser.add_argument("--books", type=int, default=3, help="How many books to use.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[500, 2000, 5000, 20000],
+                        help="Tokens per tagging batch to compare.")
+    parser.add_argument("--memory", action="store_true",
+                        help="Also report tracemalloc peak (slows every run down).")
+    args = parser.parse_args()
+
+    files = sorted(fn for fn in os.listdir(args.raw_dir) if is_text_file(fn))[:args.books]
+    if not files:
+        raise SystemExit(f"No raw texts under {args.raw_dir}. Run the crawler first.")
+    texts = []
+    for fn in files:
+        with open_text(os.path.join(args.raw_dir, fn), "r") as f:
+            texts.append(cv.strip_gutenberg_header_footer(f.read()))
+    n_tokens = sum(len(word_tokenize(t, preserve_line=True)) for t in texts)
+    print(f"[INFO] {len(texts)} books, {n_tokens} raw tokens")
+
+    # Warm up: load tagger, WordNet and stopwords once so no run pays the first-load cost
+    cv.tokenize_and_lemmatize("A short warm-up sentence.")
+    pos_tag(["warm", "up"])
+
+    runs = [("whole-book pos_tag", whole_book_lemmas)]
+    for bs in args.batch_sizes:
+        runs.append((f"batched {bs}", lambda text, bs=bs: cv.tokenize_and_lemmatize(text, batch_size=bs)))
+
+    reference = None
+    print()
+    print(f"{'method':<22} {'secs':>8} {'tokens/s':>10} {'peak MB':>8} {'lemma diff %':>13}")
+    for label, fn in runs:
+        lemmas, elapsed, peak = measure(fn, texts, args.memory)
+        if reference is None:
+            reference = lemmas
+        # multiset difference of lemmas vs the whole-book run
+        diff = sum(sum((Counter(a) - Counter(b)).values()) for a, b in zip(lemmas, reference))
+        total = sum(len(r) for r in reference) or 1
+        peak_txt = f"{peak / 1e6:.1f}" if args.memory else "-"
+        print(f"{label:<22} {elapsed:>8.2f} {n_tokens / elapsed:>10.0f} {peak_txt:>8} {100 * diff / total:>13.3f}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
@@ -6,10 +6,20 @@
 import os
 import re
 import csv
+import hashlib
+import inspect
 from collections import Counter
-from typing import Tuple, List
+from typing import Iterator, Tuple, List
 
 import nltk
+import numpy as np
+
+from columnar import npz_path_for, save_columns
+from compressed_io import (codec_suffix, is_text_file, iter_text_chunks, one_per_variant, open_text,
+                           remove_other_variants, strip_text_suffix, text_sha1)
+from dedup import (NUM_PERM, SHINGLE_SIZE, MinHasher, find_duplicate_clusters, pick_representatives,
+                   shingle_hashes, write_cluster_report)
+from snapshot_store import SNAPSHOT_DIR, crawl_date_of, load_book, read_book_index, save_book, save_snapshot
 
 # --- Ensure NLTK data is available (idempotent and robust across versions) ---
 def ensure_nltk_data():
@@ -41,7 +51,8 @@ ensure_nltk_data()
 
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
-from nltk import pos_tag, word_tokenize
+from nltk import word_tokenize
+from nltk.tag.perceptron import PerceptronTagger
 
 RAW_DIR = "data/raw"
 CLEAN_DIR = "data/clean"
@@ -51,6 +62,26 @@ os.makedirs(OUTPUTS_DIR, exist_ok=True)
 
 TOP100_CSV = os.path.join(OUTPUTS_DIR, "top100_words.csv")
 PERBOOK_STATS_CSV = os.path.join(OUTPUTS_DIR, "per_book_token_counts.csv")
+TOP20_CSV = os.path.join(OUTPUTS_DIR, "top20_books.csv")
+# Optional compression for cleaned files: "" (plain .txt), "gz" or "xz"
+CLEAN_COMPRESSION = os.environ.get("CLEAN_COMPRESSION", "")
+
+# Near-duplicate editions (MinHash/LSH, see dedup.py). Clusters are always reported;
+# set DEDUP_KEEP_ONE=1 to count only one representative per cluster in the vocabulary
+# (and, via the report's counted column, in zipf_analysis.py / prune_vocab.py).
+DUP_CLUSTERS_CSV = os.path.join(OUTPUTS_DIR, "duplicate_clusters.csv")
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.5))
+DEDUP_KEEP_ONE = os.environ.get("DEDUP_KEEP_ONE", "0") == "1"
+
+# POS tagging runs in batches of whole sentences of about this many tokens (tuning knob)
+POS_BATCH_SIZE = int(os.environ.get("POS_BATCH_SIZE", 5000))
+if POS_BATCH_SIZE < 1:
+    # smaller values would tag every token on its own, without context
+    raise ValueError(f"POS_BATCH_SIZE must be at least 1, got {POS_BATCH_SIZE}")
+
+# Each run is recorded in the snapshot store (see snapshot_store.py; SNAPSHOT_DIR="" disables it).
+# Books already stored by an earlier run are reused instead of re-tagged (SNAPSHOT_REUSE=0 forces recompute).
+SNAPSHOT_REUSE = os.environ.get("SNAPSHOT_REUSE", "1") == "1"
 
 def strip_gutenberg_header_footer(text: str) -> str:
     low = text.lower()
@@ -85,64 +116,188 @@ def nltk_pos_to_wordnet_pos(tag: str) -> str:
         return 'r'
     return 'n'
 
-def tokenize_and_lemmatize(text: str) -> List[str]:
-    # FIX: preserve_line=True to avoid requiring punkt_tab for sentence segmentation
-    tokens = word_tokenize(text, preserve_line=True)
-    tokens = [t.lower() for t in tokens if t.isalpha()]
+_tagger = None
 
-    tagged = pos_tag(tokens)
+def get_tagger() -> PerceptronTagger:
+    # Load the averaged perceptron tagger once per process instead of on every pos_tag call
+    global _tagger
+    if _tagger is None:
+        _tagger = PerceptronTagger()
+    return _tagger
 
+def iter_sentence_batches(raw_tokens: List[str], batch_size: int) -> Iterator[List[str]]:
+    # Group the kept (lowercased, alphabetic) tokens into batches of whole sentences.
+    # The token sequence is the same as before, but the tagger now starts a fresh context
+    # at every batch edge (the old whole-book call never did), so tags near the edges can
+    # differ; ending batches on sentence ends keeps that effect small. bench_pos_tagging.py
+    # reports the resulting lemma difference.
+    # With preserve_line=True a sentence end is a "." / "!" / "?" token or a token ending in ".".
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+    batch, sent = [], []
+    for t in raw_tokens:
+        if t.isalpha():
+            sent.append(t.lower())
+            if len(sent) < batch_size:
+                continue
+        elif not (t in ("!", "?") or t.endswith(".")):
+            continue
+        batch.extend(sent)
+        sent = []
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    batch.extend(sent)
+    if batch:
+        yield batch
+
+def tokenize_and_lemmatize(text: str, batch_size: int = 0) -> List[str]:
+    # FIX: preserve_line=True to avoid requiring punkt_tab for sentence segmentation
+    raw_tokens = word_tokenize(text, preserve_line=True)
+
+    tagger = get_tagger()
     lemmatizer = WordNetLemmatizer()
     stop = set(stopwords.words("english"))
 
+    # Tag batch by batch and lemmatize right away; the whole book is never held as (token, tag) pairs
     lemmas = []
-    for tok, tg in tagged:
-        if tok in stop:
-            continue
-        wn_pos = nltk_pos_to_wordnet_pos(tg)
-        lemma = lemmatizer.lemmatize(tok, pos=wn_pos)
-        if lemma and lemma not in stop:
-            lemmas.append(lemma)
+    for batch in iter_sentence_batches(raw_tokens, batch_size or POS_BATCH_SIZE):
+        for tok, tg in tagger.tag(batch):
+            if tok in stop:
+                continue
+            wn_pos = nltk_pos_to_wordnet_pos(tg)
+            lemma = lemmatizer.lemmatize(tok, pos=wn_pos)
+            if lemma and lemma not in stop:
+                lemmas.append(lemma)
     return lemmas
 
+def clean_path_for(name: str) -> str:
+    return os.path.join(CLEAN_DIR, f"{name}.clean.txt" + codec_suffix(CLEAN_COMPRESSION))
+
+def find_clean_file(name: str) -> str:
+    # Existing cleaned file for a book in any codec (newest if several), or ""
+    base = os.path.join(CLEAN_DIR, f"{name}.clean.txt")
+    found = [base + suffix for suffix in ("", ".gz", ".xz") if os.path.exists(base + suffix)]
+    return one_per_variant(found)[0] if found else ""
+
+def read_clean_counts(name: str) -> Counter:
+    cnt = Counter()
+    for chunk in iter_text_chunks(find_clean_file(name)):
+        cnt.update(chunk.split())
+    return cnt
+
 def process_file(path: str) -> Tuple[str, List[str]]:
-    base = os.path.basename(path)
-    name, _ = os.path.splitext(base)
+    # Raw files may be plain .txt or .txt.gz / .txt.xz; the codec follows the suffix
+    name = strip_text_suffix(path)
 
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+    with open_text(path, "r") as f:
         raw = f.read()
 
     core = strip_gutenberg_header_footer(raw)
     tokens = tokenize_and_lemmatize(core)
 
-    clean_path = os.path.join(CLEAN_DIR, f"{name}.clean.txt")
-    with open(clean_path, "w", encoding="utf-8") as f:
+    clean_path = clean_path_for(name)
+    with open_text(clean_path, "w", errors="strict") as f:
         f.write(" ".join(tokens))
+    remove_other_variants(clean_path)
 
     return name, tokens
 
+def _source_of(fn) -> str:
+    # Source text, or the bytecode when no source is available (e.g. .pyc-only installs)
+    try:
+        return inspect.getsource(fn)
+    except (OSError, TypeError):
+        return fn.__code__.co_code.hex()
+
+def pipeline_fingerprint() -> str:
+    # Everything that shapes a book's counts: tunables, the cleaning/tagging/lemmatizing code,
+    # NLTK version and stopword list, and the MinHash settings (signatures are stored too).
+    # Stored counts are only reused when this matches.
+    code = "".join(_source_of(fn) for fn in (
+        strip_gutenberg_header_footer, nltk_pos_to_wordnet_pos, iter_sentence_batches, tokenize_and_lemmatize))
+    parts = [
+        f"pos_batch={POS_BATCH_SIZE}",
+        f"nltk={nltk.__version__}",
+        "stop=" + hashlib.sha1(" ".join(sorted(stopwords.words("english"))).encode("utf-8")).hexdigest(),
+        f"minhash={NUM_PERM}/{SHINGLE_SIZE}",
+        "code=" + hashlib.sha1(code.encode("utf-8")).hexdigest(),
+    ]
+    return ";".join(parts)
+
 def main():
     print("[INFO] Scanning raw texts ...")
-    files = [os.path.join(RAW_DIR, fn) for fn in os.listdir(RAW_DIR) if fn.lower().endswith(".txt")]
-    files.sort()
+    files = [os.path.join(RAW_DIR, fn) for fn in os.listdir(RAW_DIR) if is_text_file(fn)]
+    files = one_per_variant(sorted(files))
     if not files:
-        raise SystemExit("No raw .txt files found under data/raw. Run the crawler first.")
+        raise SystemExit("No raw .txt/.txt.gz/.txt.xz files found under data/raw. Run the crawler first.")
 
     global_vocab = Counter()
     per_book_counts = []
+    signatures = {}
+    hasher = MinHasher()
+
+    book_index = read_book_index(TOP20_CSV) if SNAPSHOT_DIR else {}
+    fingerprint = pipeline_fingerprint() if SNAPSHOT_DIR else ""
+    reused = {}  # name -> (book_id, raw sha1) for books whose counts came from the store
 
     for fp in files:
-        print(f"[INFO] Processing: {os.path.basename(fp)}")
-        name, tokens = process_file(fp)
-        cnt = Counter(tokens)
+        name = strip_text_suffix(fp)
+        meta = book_index.get(name)
+        raw_sha1 = text_sha1(fp) if meta else ""
+        # Reuse counts stored by an earlier crawl of the same text (only if data/clean still
+        # has the book, so zipf_analysis.py / prune_vocab.py see the same corpus)
+        cached = None
+        if meta and SNAPSHOT_REUSE and find_clean_file(name):
+            cached = load_book(SNAPSHOT_DIR, meta["book_id"], fingerprint, raw_sha1)
+        if cached:
+            print(f"[INFO] Reusing stored counts: {os.path.basename(fp)} (ebook {meta['book_id']})")
+            cnt, signatures[name] = cached
+            reused[name] = (meta["book_id"], raw_sha1)
+        else:
+            print(f"[INFO] Processing: {os.path.basename(fp)}")
+            name, tokens = process_file(fp)
+            signatures[name] = hasher.signature(shingle_hashes(tokens))
+            cnt = Counter(tokens)
+            if meta:
+                save_book(SNAPSHOT_DIR, meta["book_id"], cnt, signatures[name], fingerprint, raw_sha1)
+        # Aggregate right away so only signatures and sizes outlive the loop;
+        # duplicate editions are subtracted again below
         global_vocab.update(cnt)
         per_book_counts.append({"book": name, "unique_tokens": len(cnt), "total_tokens": sum(cnt.values())})
 
+    # Detect near-duplicate editions before aggregating into the global vocabulary
+    sizes = {row["book"]: row["total_tokens"] for row in per_book_counts}
+    clusters, best_sim = find_duplicate_clusters(signatures, threshold=DEDUP_THRESHOLD)
+
+    skipped = set()
+    if DEDUP_KEEP_ONE:
+        rep_of = pick_representatives(clusters, sizes)
+        skipped = {name for name, rep in rep_of.items() if name != rep}
+        for name in sorted(skipped):
+            print(f"[INFO] Skipping duplicate edition: {name} (kept: {rep_of[name]})")
+            # subtract exactly what was added above: the stored counts for a reused book,
+            # otherwise the cleaned file this run just wrote
+            if name in reused:
+                book_id, raw_sha1 = reused[name]
+                global_vocab.subtract(load_book(SNAPSHOT_DIR, book_id, fingerprint, raw_sha1)[0])
+            else:
+                global_vocab.subtract(read_clean_counts(name))
+        global_vocab += Counter()  # drop words whose count fell to zero
+    # The report's counted column tells zipf_analysis.py / prune_vocab.py which books to leave out
+    write_cluster_report(DUP_CLUSTERS_CSV, clusters, sizes, best_sim, skipped)
+    print(f"[INFO] {len(clusters)} near-duplicate clusters -> {DUP_CLUSTERS_CSV}")
+
     with open(PERBOOK_STATS_CSV, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=["book", "unique_tokens", "total_tokens"])
         writer.writeheader()
         writer.writerows(per_book_counts)
-    print(f"[INFO] Per-book token stats -> {PERBOOK_STATS_CSV}")
+    save_columns(npz_path_for(PERBOOK_STATS_CSV), {
+        "book": [r["book"] for r in per_book_counts],
+        "unique_tokens": np.array([r["unique_tokens"] for r in per_book_counts], dtype=np.int64),
+        "total_tokens": np.array([r["total_tokens"] for r in per_book_counts], dtype=np.int64),
+    })
+    print(f"[INFO] Per-book token stats -> {PERBOOK_STATS_CSV} (+ .npz)")
 
     top100 = global_vocab.most_common(100)
     with open(TOP100_CSV, "w", newline="", encoding="utf-8") as f:
@@ -150,7 +305,28 @@ def main():
         writer.writerow(["rank", "word", "count"])
         for i, (w, c) in enumerate(top100, start=1):
             writer.writerow([i, w, c])
-    print(f"[INFO] Top-100 vocabulary -> {TOP100_CSV}")
+    save_columns(npz_path_for(TOP100_CSV), {
+        "rank": np.arange(1, len(top100) + 1, dtype=np.int64),
+        "word": [w for w, _ in top100],
+        "count": np.array([c for _, c in top100], dtype=np.int64),
+    }, meta={"total_tokens": sum(global_vocab.values()), "types": len(global_vocab)})
+    print(f"[INFO] Top-100 vocabulary -> {TOP100_CSV} (+ .npz)")
+
+    if SNAPSHOT_DIR:
+        date = crawl_date_of(TOP20_CSV)
+        snap_books = []
+        for row in per_book_counts:
+            meta = book_index.get(row["book"], {})
+            snap_books.append({
+                "book_id": meta.get("book_id", row["book"]),
+                "title": meta.get("title", row["book"]),
+                "rank": meta.get("rank", 0),
+                "unique_tokens": row["unique_tokens"],
+                "total_tokens": row["total_tokens"],
+                "counted": int(row["book"] not in skipped),
+            })
+        snap_path = save_snapshot(SNAPSHOT_DIR, date, snap_books, global_vocab)
+        print(f"[INFO] Snapshot for crawl date {date} -> {snap_path}")
 
     print("\nTop 20 preview:")
     for i, (w, c) in enumerate(top100[:20], start=1):
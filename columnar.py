@@ -0,0 +1,86 @@
+# columnar.py
+# Purpose: Compact binary companions to the CSVs in outputs/. Each table is one
+# compressed .npz with one typed array per column, so readers load only the columns
+# (or summary values) they need instead of re-parsing text. String columns are stored
+# as a single UTF-8 buffer plus offsets rather than fixed-width unicode arrays.
+# Scalar summary values (e.g. the fitted Zipf exponent) ride along as "meta" entries.
+# The CSVs are the tracked source of truth; an .npz older than its CSV (after a checkout,
+# a pull or a stage that rewrote only the CSV) is treated as stale and ignored.
+
+import csv
+import os
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+_STR = "__utf8"
+_OFF = "__offsets"
+_META = "meta__"
+
+def npz_path_for(csv_path: str) -> str:
+    """outputs/top100_words.csv -> outputs/top100_words.npz"""
+    return os.path.splitext(csv_path)[0] + ".npz"
+
+def current_npz(csv_path: str) -> Optional[str]:
+    """The .npz companion of csv_path if it exists and is not older than the CSV, else None."""
+    npz_path = npz_path_for(csv_path)
+    if not os.path.exists(npz_path):
+        return None
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(npz_path):
+        return None
+    return npz_path
+
+def save_columns(path: str, columns: Dict[str, Sequence], meta: Optional[Dict[str, object]] = None) -> str:
+    """Write equally long columns (str columns -> UTF-8 buffer + offsets) and scalar meta values."""
+    arrays = {}
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+            arrays[name] = values
+            continue
+        values = list(values)
+        if values and isinstance(values[0], str):
+            encoded = [v.encode("utf-8") for v in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            arrays[name + _STR] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            arrays[name + _OFF] = offsets
+        else:
+            arrays[name] = np.asarray(values)
+    for key, value in (meta or {}).items():
+        arrays[_META + key] = np.asarray(value)
+    np.savez_compressed(path, **arrays)
+    return path
+
+def load_meta(path: str) -> Dict[str, object]:
+    """Only the scalar meta values; column arrays are not read."""
+    with np.load(path, allow_pickle=False) as data:
+        return {k[len(_META):]: data[k].item() for k in data.files if k.startswith(_META)}
+
+def load_columns(path: str, names: Sequence[str]) -> Dict[str, Sequence]:
+    """Selected columns; numeric columns as arrays, str columns as lists."""
+    out = {}
+    with np.load(path, allow_pickle=False) as data:
+        for name in names:
+            if name + _STR in data.files:
+                buf = data[name + _STR].tobytes()
+                off = data[name + _OFF].tolist()
+                out[name] = [buf[off[i]:off[i + 1]].decode("utf-8") for i in range(len(off) - 1)]
+            elif name in data.files:
+                out[name] = data[name]
+            else:
+                raise KeyError(f"Column {name!r} not found in {path}")
+    return out
+
+def iter_table(csv_path: str, names: Sequence[str]) -> Iterator[tuple]:
+    """
+    Rows of the selected columns, from the .npz companion if it is current, otherwise by
+    streaming the CSV (values then stay strings).
+    """
+    npz_path = current_npz(csv_path)
+    if npz_path:
+        cols = load_columns(npz_path, names)
+        yield from zip(*(cols[n].tolist() if isinstance(cols[n], np.ndarray) else cols[n] for n in names))
+        return
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield tuple(row[n] for n in names)
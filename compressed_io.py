@@ -0,0 +1,131 @@
+# compressed_io.py
+# Purpose: Transparent gzip/xz storage for the text files under data/raw and
+# data/clean. Writers pick a codec by name; readers detect it from the file
+# extension, so plain and compressed files can live side by side.
+
+import gzip
+import hashlib
+import lzma
+import os
+from typing import IO, Iterator, List, Optional
+
+# Codec name -> file suffix appended after ".txt" (stdlib codecs only)
+CODECS = {
+    "": "",
+    "none": "",
+    "gz": ".gz",
+    "gzip": ".gz",
+    "xz": ".xz",
+}
+COMPRESSED_SUFFIXES = (".gz", ".xz")
+TEXT_SUFFIXES = (".txt",) + tuple(".txt" + s for s in COMPRESSED_SUFFIXES)
+
+CHUNK_SIZE = 1 << 20  # characters per read when streaming
+
+def codec_suffix(codec: Optional[str]) -> str:
+    """Map a codec name ('', 'none', 'gz'/'gzip', 'xz') to its file suffix."""
+    key = (codec or "").strip().lower()
+    if key not in CODECS:
+        raise ValueError(f"Unknown compression codec: {codec!r} (choose from none, gz, xz)")
+    return CODECS[key]
+
+def is_text_file(name: str) -> bool:
+    """True for .txt files and their .txt.gz / .txt.xz counterparts."""
+    return name.lower().endswith(TEXT_SUFFIXES)
+
+def strip_text_suffix(name: str) -> str:
+    """'Book.txt.gz' -> 'Book', 'Book.clean.txt' -> 'Book.clean'."""
+    base = os.path.basename(name)
+    for suffix in COMPRESSED_SUFFIXES:
+        if base.lower().endswith(suffix):
+            base = base[: -len(suffix)]
+            break
+    stem, _ = os.path.splitext(base)
+    return stem
+
+def variant_key(path) -> str:
+    """The plain-text path a (possibly compressed) file stands for: 'x/Book.txt.gz' -> 'x/Book.txt'."""
+    path = os.fspath(path)
+    for suffix in COMPRESSED_SUFFIXES:
+        if path.lower().endswith(suffix):
+            return path[: -len(suffix)]
+    return path
+
+def one_per_variant(paths: list) -> List:
+    """
+    Keep one file per book when several codec variants exist (e.g. Book.txt and Book.txt.gz
+    left behind by a codec switch): the most recently written one wins, with a warning.
+    Order of the input is preserved for the kept files.
+    """
+    groups = {}
+    for i, p in enumerate(paths):
+        groups.setdefault(variant_key(p), []).append(i)
+    keep = set()
+    for key, members in groups.items():
+        newest = max(members, key=lambda i: os.path.getmtime(paths[i]))
+        if len(members) > 1:
+            others = ", ".join(os.path.basename(os.fspath(paths[i])) for i in members if i != newest)
+            print(f"[WARN] Several codec variants of {os.path.basename(key)}; "
+                  f"using {os.path.basename(os.fspath(paths[newest]))}, ignoring {others}")
+        keep.add(newest)
+    return [p for i, p in enumerate(paths) if i in keep]
+
+def remove_other_variants(path) -> None:
+    """After writing path, delete its siblings in other codecs so readers see one copy."""
+    path = os.fspath(path)
+    key = variant_key(path)
+    for suffix in ("",) + COMPRESSED_SUFFIXES:
+        other = key + suffix
+        if other != path and os.path.exists(other):
+            os.remove(other)
+
+def open_text(path, mode: str = "r", encoding: str = "utf-8", errors: str = "ignore",
+              level: Optional[int] = None) -> IO[str]:
+    """
+    Open a text file for reading or writing, compressed or not, based on its suffix.
+    mode is 'r' or 'w'; level is the gzip compresslevel / xz preset (None = codec default).
+    """
+    path = os.fspath(path)
+    mode = mode.replace("t", "")
+    low = path.lower()
+    if low.endswith(".gz"):
+        return gzip.open(path, mode + "t", compresslevel=6 if level is None else level,
+                         encoding=encoding, errors=errors)
+    if low.endswith(".xz"):
+        return lzma.open(path, mode + "t", preset=level if "w" in mode else None,
+                         encoding=encoding, errors=errors)
+    return open(path, mode, encoding=encoding, errors=errors)
+
+def iter_text_chunks(path, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Stream a (possibly compressed) text file in chunks that always end on whitespace,
+    so a token is never split across two chunks. Memory use is bounded by chunk_size.
+    """
+    carry = ""
+    with open_text(path, "r") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            block = carry + block
+            if block[-1].isspace():
+                carry = ""
+                yield block
+                continue
+            # Hold back the trailing partial token until the next read
+            parts = block.rsplit(None, 1)
+            if len(parts) == 1:
+                carry = block
+            else:
+                carry = parts[1]
+                yield parts[0]
+    if carry:
+        yield carry
+
+def text_sha1(path, chunk_size: int = CHUNK_SIZE) -> str:
+    """sha1 of the decoded text, so the same book hashes alike in any codec."""
+    digest = hashlib.sha1()
+    with open_text(path, "r") as f:
+        for block in iter(lambda: f.read(chunk_size), ""):
+            digest.update(block.encode("utf-8"))
+    return digest.hexdigest()
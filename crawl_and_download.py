@@ -7,17 +7,35 @@ import os
 import time
 import csv
 import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional
 
 import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+from columnar import npz_path_for, save_columns
+from compressed_io import codec_suffix, open_text, remove_other_variants
+
 BASE_URL = "https://www.gutenberg.org"
 TOP_URL = f"{BASE_URL}/browse/scores/top"  # page that contains "Top 100 EBooks yesterday/last 7 days/last 30 days"
 RAW_DIR = "data/raw"
 OUTPUTS_DIR = "outputs"
 CSV_PATH = os.path.join(OUTPUTS_DIR, "top20_books.csv")
+# Optional compression for raw files: "" (plain .txt), "gz" or "xz"
+RAW_COMPRESSION = os.environ.get("RAW_COMPRESSION", "")
+
+# Crawl tuning knobs (env vars; crawl_loadtest.py sets them directly on the module)
+TOP_N = int(os.environ.get("CRAWL_TOP_N", 20))            # how many books to download
+MAX_WORKERS = int(os.environ.get("CRAWL_WORKERS", 1))     # concurrent book downloads
+POLITE_DELAY = float(os.environ.get("CRAWL_DELAY", 1.0))  # seconds to sleep after each book (per worker)
+MAX_RETRIES = int(os.environ.get("CRAWL_RETRIES", 2))     # retries on 429/5xx and connection errors
+BACKOFF = float(os.environ.get("CRAWL_BACKOFF", 1.0))     # base backoff in seconds (doubles per retry)
+MAX_RETRY_AFTER = float(os.environ.get("CRAWL_MAX_RETRY_AFTER", 60))  # cap on any single retry wait (s)
+TIMEOUT = float(os.environ.get("CRAWL_TIMEOUT", 30))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 HEADERS = {
     # Use a friendly UA to avoid being blocked by basic anti-bot filters
@@ -27,15 +45,60 @@ HEADERS = {
 os.makedirs(RAW_DIR, exist_ok=True)
 os.makedirs(OUTPUTS_DIR, exist_ok=True)
 
-def fetch(url: str) -> Optional[requests.Response]:
-    """Fetch a URL with basic error handling and timeouts."""
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=30)
-        resp.raise_for_status()
-        return resp
-    except Exception as e:
-        print(f"[WARN] Failed to fetch {url}: {e}")
-        return None
+# Counters shared across worker threads: requests, retries, bytes, fetch_errors (failed requests),
+# probe_misses (expected 404s while guessing a text URL) and failed_books (books not downloaded)
+STATS = Counter()
+_stats_lock = threading.Lock()
+
+def _bump(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        STATS[key] += n
+
+def _retry_delay(resp: Optional[requests.Response], attempt: int) -> float:
+    """Honour a numeric Retry-After header, otherwise use exponential backoff; capped at MAX_RETRY_AFTER."""
+    delay = BACKOFF * (2 ** attempt)
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.strip().isdigit():
+            delay = float(retry_after)
+    return min(delay, MAX_RETRY_AFTER)
+
+def fetch(url: str, probe: bool = False) -> Optional[requests.Response]:
+    """
+    Fetch a URL with basic error handling, timeouts and retries on throttling/server errors.
+    probe=True marks a guessed URL: a 404 there is expected and counted as a probe miss, not an error.
+    """
+    last_err = None
+    delay = 0.0
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            _bump("retries")
+            time.sleep(delay)
+        _bump("requests")
+        try:
+            resp = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            # connection errors / timeouts are worth another try
+            last_err = e
+            delay = _retry_delay(None, attempt)
+            continue
+        _bump("bytes", len(resp.content))
+        if resp.status_code in RETRY_STATUSES:
+            last_err = f"HTTP {resp.status_code}"
+            delay = _retry_delay(resp, attempt)
+            continue
+        if probe and resp.status_code == 404:
+            _bump("probe_misses")
+            return None
+        try:
+            resp.raise_for_status()
+            return resp
+        except Exception as e:
+            last_err = e
+            break
+    _bump("fetch_errors")
+    print(f"[WARN] Failed to fetch {url}: {last_err}")
+    return None
 
 def extract_last30_book_links(html: str) -> List[Tuple[str, str]]:
     """
@@ -114,7 +177,7 @@ def find_txt_download_url(book_page_html: str) -> Optional[str]:
             f"{BASE_URL}/files/{book_id}/pg{book_id}.txt",
         ]
         for url in candidates:
-            resp = fetch(url)
+            resp = fetch(url, probe=True)
             if resp and resp.ok and len(resp.text.strip()) > 0:
                 return url
 
@@ -143,9 +206,11 @@ def download_txt(title: str, book_url: str) -> Tuple[str, Optional[str]]:
     # Sanitize filename
     safe_title = re.sub(r"[^\w\-\. ]+", "_", title).strip()[:120]
     filename = f"{safe_title}.txt" if safe_title else os.path.basename(txt_url) or "book.txt"
-    local_path = os.path.join(RAW_DIR, filename)
-    with open(local_path, "w", encoding="utf-8", errors="ignore") as f:
+    local_path = os.path.join(RAW_DIR, filename + codec_suffix(RAW_COMPRESSION))
+    with open_text(local_path, "w", errors="ignore") as f:
         f.write(resp_txt.text)
+    # a copy from an earlier crawl in another codec would be read as a second book
+    remove_other_variants(local_path)
 
     return local_path, txt_url
 
@@ -160,30 +225,37 @@ def main():
     if not books:
         raise SystemExit("No books found in last-30-days section.")
 
-    # Keep only first 20
-    top20 = books[:20]
-    print(f"[INFO] Found {len(top20)} books (top-20 of last 30 days).")
+    # Keep only first TOP_N (20 by default)
+    top20 = books[:TOP_N]
+    print(f"[INFO] Found {len(top20)} books (top-{TOP_N} of last 30 days).")
 
-    rows = []
-    for title, book_url in tqdm(top20, desc="Downloading", unit="book"):
+    def download_row(item: Tuple[str, str]) -> dict:
+        title, book_url = item
         local_path, txt_url = download_txt(title, book_url)
-        rows.append(
-            {
-                "title": title,
-                "book_page": book_url,
-                "txt_url": txt_url or "",
-                "local_path": local_path or "",
-            }
-        )
-        time.sleep(1)  # be polite
+        if not local_path:
+            _bump("failed_books")
+        time.sleep(POLITE_DELAY)  # be polite
+        return {
+            "title": title,
+            "book_page": book_url,
+            "txt_url": txt_url or "",
+            "local_path": local_path or "",
+        }
+
+    # executor.map keeps the ranking order of the rows
+    with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS)) as executor:
+        rows = list(tqdm(executor.map(download_row, top20), total=len(top20),
+                         desc="Downloading", unit="book"))
 
     # Write CSV
     with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=["title", "book_page", "txt_url", "local_path"])
         writer.writeheader()
         writer.writerows(rows)
+    fields = ["title", "book_page", "txt_url", "local_path"]
+    save_columns(npz_path_for(CSV_PATH), {k: [r[k] for r in rows] for k in fields})
 
-    print(f"[INFO] Done. CSV written to: {CSV_PATH}")
+    print(f"[INFO] Done. CSV written to: {CSV_PATH} (+ .npz)")
     print(f"[INFO] Raw texts saved under: {RAW_DIR}")
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+# crawl_loadtest.py
+# Purpose: Load-test crawl_and_download.py against the local Gutenberg stand-in
+# (gutenberg_stub_server.py) instead of gutenberg.org. Points the crawler's BASE_URL
+# at the stub, runs a full crawl for each worker count, and reports books/sec,
+# requests, retries, failed books, request errors and bandwidth so concurrency and rate limits can be
+# tuned offline. Downloads go to a temporary folder; outputs/ is left untouched.
+#
+#   python crawl_loadtest.py --books 200 --top-n 100 --workers 1 4 8 --latency 0.05 --error-rate 0.05
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import crawl_and_download as crawler
+from gutenberg_stub_server import add_server_arguments, make_server
+
+def point_crawler_at(base_url: str, work_dir: str, args, workers: int) -> None:
+    """Rebind the crawler's module-level settings for one run."""
+    crawler.BASE_URL = base_url.rstrip("/")
+    crawler.TOP_URL = f"{crawler.BASE_URL}/browse/scores/top"
+    crawler.RAW_DIR = os.path.join(work_dir, "raw")
+    crawler.CSV_PATH = os.path.join(work_dir, "top20_books.csv")
+    crawler.TOP_N = args.top_n
+    crawler.MAX_WORKERS = workers
+    crawler.POLITE_DELAY = args.delay
+    crawler.MAX_RETRIES = args.retries
+    crawler.BACKOFF = args.backoff
+    crawler.MAX_RETRY_AFTER = args.max_retry_after
+    crawler.TIMEOUT = args.timeout
+    crawler.RAW_COMPRESSION = args.compression
+    os.makedirs(crawler.RAW_DIR, exist_ok=True)
+    crawler.STATS.clear()
+
+def count_downloaded(csv_path: str) -> int:
+    if not os.path.exists(csv_path):
+        return 0
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return sum(1 for row in csv.DictReader(f) if row["local_path"])
+
+def run_once(base_url: str, args, workers: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="crawl_loadtest_") as work_dir:
+        point_crawler_at(base_url, work_dir, args, workers)
+        t0 = time.perf_counter()
+        crawler.main()
+        elapsed = time.perf_counter() - t0
+        books = count_downloaded(crawler.CSV_PATH)
+    stats = dict(crawler.STATS)
+    return {
+        "workers": workers,
+        "books": books,
+        "elapsed": elapsed,
+        "requests": stats.get("requests", 0),
+        "retries": stats.get("retries", 0),
+        "failed_books": stats.get("failed_books", 0),
+        "fetch_errors": stats.get("fetch_errors", 0),
+        "probe_misses": stats.get("probe_misses", 0),
+        "bytes": stats.get("bytes", 0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the crawler against a local Gutenberg stand-in.")
+    parser.add_argument("--url", type=str, default="",
+                        help="Use an already running stub server (default: start one in-process).")
+    parser.add_argument("--top-n", type=int, default=20, help="Books the crawler downloads per run.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="Worker counts to sweep (one crawl per value).")
+    parser.add_argument("--delay", type=float, default=0.0, help="Crawler's polite delay after each book (s).")
+    parser.add_argument("--retries", type=int, default=crawler.MAX_RETRIES, help="Crawler's max retries.")
+    parser.add_argument("--backoff", type=float, default=0.1, help="Crawler's base backoff (s).")
+    parser.add_argument("--max-retry-after", type=float, default=crawler.MAX_RETRY_AFTER,
+                        help="Crawler's cap on a single Retry-After / backoff wait (s).")
+    parser.add_argument("--timeout", type=float, default=crawler.TIMEOUT, help="Crawler's request timeout (s).")
+    parser.add_argument("--compression", type=str, default="", help="Raw file codec: '', gz or xz.")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = make_server(args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = server.state.base_url
+        print(f"[INFO] Stub server running at {base_url} ({args.books} books, layout={args.layout})")
+
+    results = []
+    try:
+        for workers in args.workers:
+            print(f"[INFO] Crawl with {workers} worker(s) ...")
+            results.append(run_once(base_url, args, workers))
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    print()
+    print(f"{'workers':>7} {'books':>6} {'failed':>6} {'secs':>8} {'books/s':>8} {'requests':>9} "
+          f"{'retries':>8} {'errors':>7} {'probe404':>8} {'MB':>8} {'MB/s':>7}")
+    for r in results:
+        secs = r["elapsed"] or float("nan")
+        print(f"{r['workers']:>7} {r['books']:>6} {r['failed_books']:>6} {r['elapsed']:>8.2f} "
+              f"{r['books'] / secs:>8.2f} {r['requests']:>9} {r['retries']:>8} {r['fetch_errors']:>7} "
+              f"{r['probe_misses']:>8} {r['bytes'] / 1e6:>8.1f} {r['bytes'] / 1e6 / secs:>7.1f}")
+    print("\nfailed = books not downloaded; errors = requests that failed after retries; "
+          "probe404 = expected misses while guessing text URLs.")
+    if server:
+        print(f"\n[INFO] Server side: {dict(server.state.counters)}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
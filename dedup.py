@@ -0,0 +1,248 @@
+# dedup.py
+# Purpose: Detect near-duplicate books (several editions of the same work) before
+# their tokens are aggregated into the global vocabulary. Each cleaned book is
+# reduced to a MinHash signature over word k-gram shingles; LSH banding then only
+# compares books that share at least one band bucket, so the cost grows roughly
+# linearly with the number of books instead of quadratically.
+#
+#   python dedup.py --clean-dir data/clean --threshold 0.5
+
+import argparse
+import csv
+import os
+import sys
+import zlib
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from compressed_io import is_text_file, iter_text_chunks, one_per_variant, strip_text_suffix
+
+SHINGLE_SIZE = 5      # words per shingle
+NUM_PERM = 128        # MinHash signature length
+THRESHOLD = 0.5       # estimated Jaccard similarity that makes two books duplicates
+MIN_RECALL = 0.95     # LSH layout is chosen so a pair at THRESHOLD becomes a candidate this often
+HASH_BLOCK = 8192     # shingles hashed per numpy block (bounds memory per book)
+EMPTY_SLOT = np.iinfo(np.uint32).max  # signature value left untouched when a book has no shingles
+
+# -----------------------------
+# Shingling & MinHash
+# -----------------------------
+
+def shingle_hashes(tokens: Iterable[str], k: int = SHINGLE_SIZE) -> np.ndarray:
+    """Unique 32-bit hashes of all k-word shingles (a short book yields a single shingle)."""
+    window = deque(maxlen=k)
+    hashes = set()
+    for tok in tokens:
+        window.append(tok)
+        if len(window) == k:
+            hashes.add(zlib.crc32(" ".join(window).encode("utf-8")))
+    if not hashes and window:
+        hashes.add(zlib.crc32(" ".join(window).encode("utf-8")))
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+class MinHasher:
+    """
+    MinHash with num_perm multiply-shift hash functions h(x) = ((a*x + b) mod 2^64) >> 32.
+    uint64 arithmetic in numpy wraps around, which gives the mod 2^64 for free.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        sig = np.full(self.num_perm, EMPTY_SLOT, dtype=np.uint64)
+        for i in range(0, len(hashes), HASH_BLOCK):
+            block = hashes[i:i + HASH_BLOCK]
+            with np.errstate(over="ignore"):
+                mixed = (self.a[:, None] * block[None, :] + self.b[:, None]) >> np.uint64(32)
+            np.minimum(sig, mixed.min(axis=1), out=sig)
+        return sig.astype(np.uint32)
+
+# -----------------------------
+# LSH & clustering
+# -----------------------------
+
+def is_empty_signature(sig: np.ndarray) -> bool:
+    """True for the signature of a book without shingles (empty or failed download)."""
+    return bool(np.all(sig == EMPTY_SLOT))
+
+def candidate_probability(similarity: float, bands: int, rows: int) -> float:
+    """Chance that a pair with this Jaccard similarity shares at least one band: 1-(1-s^r)^b."""
+    return 1.0 - (1.0 - similarity ** rows) ** bands
+
+def bands_for_threshold(threshold: float, num_perm: int = NUM_PERM, min_recall: float = MIN_RECALL) -> int:
+    """
+    Band count (a divisor of num_perm) with the most rows per band, i.e. the fewest spurious
+    candidates, that still makes a pair at the threshold a candidate with min_recall.
+    """
+    for rows in range(num_perm, 0, -1):
+        if num_perm % rows == 0 and candidate_probability(threshold, num_perm // rows, rows) >= min_recall:
+            return num_perm // rows
+    return num_perm  # one row per band: every shared hash value makes a candidate
+
+def lsh_candidate_pairs(signatures: Dict[str, np.ndarray], bands: int) -> set:
+    """Pairs of books whose signatures collide in at least one band."""
+    names = list(signatures)
+    if not names:
+        return set()
+    num_perm = len(signatures[names[0]])
+    if num_perm % bands:
+        raise ValueError(f"Signature length {num_perm} is not divisible by {bands} bands")
+    rows = num_perm // bands
+
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for name in names:
+            key = signatures[name][band * rows:(band + 1) * rows].tobytes()
+            buckets[key].append(name)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+def estimated_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.mean(sig_a == sig_b))
+
+def find_duplicate_clusters(signatures: Dict[str, np.ndarray], threshold: float = THRESHOLD,
+                            bands: Optional[int] = None) -> Tuple[List[List[str]], Dict[str, float]]:
+    """
+    Group books into clusters of near-duplicates (union-find over verified LSH pairs).
+    Returns (clusters with 2+ members, best similarity seen for each clustered book).
+    bands=None derives the band layout from the threshold (bands_for_threshold).
+    Books without shingles are left out: their identical placeholder signatures would
+    otherwise make every empty book a duplicate of every other.
+    """
+    signatures = {name: sig for name, sig in signatures.items() if not is_empty_signature(sig)}
+    num_perm = len(next(iter(signatures.values()))) if signatures else NUM_PERM
+    if bands is None:
+        bands = bands_for_threshold(threshold, num_perm)
+    elif num_perm % bands == 0:
+        recall = candidate_probability(threshold, bands, num_perm // bands)
+        if recall < MIN_RECALL:
+            print(f"[WARN] With {bands} bands x {num_perm // bands} rows only {100 * recall:.0f}% of pairs at "
+                  f"similarity {threshold} become LSH candidates; duplicates will be missed "
+                  f"(use {bands_for_threshold(threshold, num_perm)} bands).")
+    parent = {name: name for name in signatures}
+
+    def find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    best_sim = {}
+    for a, b in lsh_candidate_pairs(signatures, bands):
+        sim = estimated_jaccard(signatures[a], signatures[b])
+        if sim < threshold:
+            continue
+        best_sim[a] = max(best_sim.get(a, 0.0), sim)
+        best_sim[b] = max(best_sim.get(b, 0.0), sim)
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+
+    groups = defaultdict(list)
+    for name in signatures:
+        groups[find(name)].append(name)
+    clusters = sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: g[0])
+    return clusters, best_sim
+
+def pick_representatives(clusters: List[List[str]], sizes: Dict[str, int]) -> Dict[str, str]:
+    """Map each clustered book to its cluster's representative: the longest edition."""
+    rep_of = {}
+    for members in clusters:
+        # members are sorted, so ties go to the alphabetically first book
+        rep = max(members, key=lambda n: sizes.get(n, 0))
+        for name in members:
+            rep_of[name] = rep
+    return rep_of
+
+def write_cluster_report(path: str, clusters: List[List[str]], sizes: Dict[str, int],
+                         best_sim: Dict[str, float], skipped: Iterable[str] = ()) -> None:
+    """
+    One row per clustered book. counted=0 marks editions left out of the vocabulary
+    (clean_and_vocab.py with DEDUP_KEEP_ONE=1); zipf_analysis.py and prune_vocab.py skip them too.
+    """
+    rep_of = pick_representatives(clusters, sizes)
+    skipped = set(skipped)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["cluster", "book", "total_tokens", "max_similarity", "representative", "counted"])
+        for cid, members in enumerate(clusters, start=1):
+            for name in members:
+                writer.writerow([cid, name, sizes.get(name, 0), f"{best_sim.get(name, 0.0):.3f}",
+                                 int(rep_of[name] == name), int(name not in skipped)])
+
+def read_skipped_books(path: str) -> List[str]:
+    """Books a cluster report marks as not counted (empty if there is no report)."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["book"] for row in csv.DictReader(f) if row.get("counted") == "0"]
+
+def clean_book_name(path: str) -> str:
+    """data/clean/Book.clean.txt.gz -> Book (the name used in the cluster report)."""
+    name = strip_text_suffix(path)
+    return name[: -len(".clean")] if name.endswith(".clean") else name
+
+# -----------------------------
+# Main (standalone run over data/clean)
+# -----------------------------
+
+def iter_file_tokens(path):
+    for chunk in iter_text_chunks(path):
+        yield from chunk.split()
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH near-duplicate detection over cleaned books.")
+    parser.add_argument("--clean-dir", type=str, default="data/clean",
+                        help="Directory of cleaned texts (space-separated tokens).")
+    parser.add_argument("--out", type=str, default=os.path.join("outputs", "duplicate_clusters.csv"),
+                        help="CSV report of duplicate clusters.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Estimated Jaccard similarity that counts as a duplicate.")
+    parser.add_argument("--shingle-size", type=int, default=SHINGLE_SIZE, help="Words per shingle.")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM, help="MinHash signature length.")
+    parser.add_argument("--bands", type=int, default=None,
+                        help="LSH bands (must divide --num-perm; default: derived from --threshold).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.clean_dir):
+        raise FileNotFoundError(f"Clean directory not found: {args.clean_dir}")
+    files = one_per_variant(sorted(os.path.join(args.clean_dir, fn)
+                                   for fn in os.listdir(args.clean_dir) if is_text_file(fn)))
+    if not files:
+        raise RuntimeError(f"No cleaned files found in: {args.clean_dir}. Run clean_and_vocab.py first.")
+
+    hasher = MinHasher(args.num_perm)
+    signatures, sizes = {}, {}
+    for fp in files:
+        name = clean_book_name(fp)
+        tokens = list(iter_file_tokens(fp))
+        sizes[name] = len(tokens)
+        signatures[name] = hasher.signature(shingle_hashes(tokens, args.shingle_size))
+
+    clusters, best_sim = find_duplicate_clusters(signatures, args.threshold, args.bands)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    # A standalone run does not change the vocabulary: keep the counted=0 marks clean_and_vocab.py left
+    write_cluster_report(args.out, clusters, sizes, best_sim, skipped=read_skipped_books(args.out))
+
+    n_dup = sum(len(c) - 1 for c in clusters)
+    print(f"[INFO] {len(files)} books, {len(clusters)} duplicate clusters, {n_dup} redundant editions")
+    for members in clusters:
+        print("  - " + " | ".join(members))
+    print(f"[INFO] Duplicate-cluster report -> {args.out}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,385 @@
+# gutenberg_stub_server.py
+# Purpose: A local stand-in for gutenberg.org so crawl_and_download.py can be measured
+# and tuned offline. Serves a scores page, book pages and Plain Text files, either
+# generated on the fly or replayed from a folder recorded from the real site.
+# Latency, error rates, throttling (429 + Retry-After), rate limits, bandwidth caps
+# and payload size are all configurable.
+#
+#   python gutenberg_stub_server.py serve --port 8000 --books 100 --latency 0.05 --error-rate 0.02
+#   python gutenberg_stub_server.py record --out fixtures/gutenberg --books 5
+#   python gutenberg_stub_server.py check-layouts   # crawler parsers vs every --layout, exit 1 on failure
+
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+LAYOUTS = ("standard", "h3-absolute", "no-plaintext-link")
+WRITE_CHUNK = 64 * 1024
+
+# -----------------------------
+# Generated content
+# -----------------------------
+
+def make_vocabulary(size: int, seed: int) -> list:
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(2, 10))))
+    return sorted(words)
+
+def make_body(n_bytes: int, seed: int, vocab_size: int = 5000) -> str:
+    """Zipf-distributed pseudo-English text of roughly n_bytes, wrapped into lines."""
+    rng = random.Random(seed)
+    vocab = make_vocabulary(vocab_size, seed)
+    weights = [1.0 / r for r in range(1, len(vocab) + 1)]
+    lines, size = [], 0
+    while size < n_bytes:
+        line = " ".join(rng.choices(vocab, weights=weights, k=12)) + ".\n"
+        lines.append(line)
+        size += len(line)
+    return "".join(lines)
+
+def book_text(book_id: int, body: str) -> str:
+    title = f"Stub Book {book_id}"
+    return (
+        f"The Project Gutenberg eBook of {title}\n\n"
+        f"*** START OF THIS PROJECT GUTENBERG EBOOK {title.upper()} ***\n"
+        f"{body}"
+        f"*** END OF THIS PROJECT GUTENBERG EBOOK {title.upper()} ***\n"
+        "End of the Project Gutenberg license.\n"
+    )
+
+def scores_page(n_books: int, first_id: int, layout: str, base_url: str) -> str:
+    tag = "h3" if layout == "h3-absolute" else "h2"
+    items = []
+    for book_id in range(first_id, first_id + n_books):
+        href = f"/ebooks/{book_id}"
+        if layout == "h3-absolute":
+            href = base_url + href
+        items.append(f'<li><a href="{href}">Stub Book {book_id} by Anonymous ({1000 - book_id % 1000})</a></li>')
+    decoy = '<li><a href="/ebooks/1">Yesterday Book</a></li>'
+    return (
+        "<html><head><title>Top 100 | Project Gutenberg</title></head><body>\n"
+        f"<{tag} id='books-last1'>Top 100 EBooks yesterday</{tag}>\n<ol>{decoy}</ol>\n"
+        f"<{tag} id='books-last30'>Top 100 EBooks last 30 days</{tag}>\n<ol>\n"
+        + "\n".join(items)
+        + "\n</ol>\n</body></html>\n"
+    )
+
+def book_page(book_id: int, layout: str, base_url: str) -> str:
+    links = [f'<a href="/ebooks/{book_id}.epub3.images">EPUB3 (E-readers incl. Send-to-Kindle)</a>']
+    if layout != "no-plaintext-link":
+        links.append(f'<a href="/ebooks/{book_id}.txt.utf-8">Plain Text UTF-8</a>')
+    return (
+        "<html><head>"
+        f'<link rel="canonical" href="{base_url}/ebooks/{book_id}">'
+        f"<title>Stub Book {book_id} | Project Gutenberg</title></head><body>\n"
+        f"<h1>Stub Book {book_id}</h1>\n<table class='files'>\n"
+        + "\n".join(f"<tr><td>{a}</td></tr>" for a in links)
+        + "\n</table>\n</body></html>\n"
+    )
+
+# -----------------------------
+# HTTP handler
+# -----------------------------
+
+class StubState:
+    """Server configuration plus counters shared by all handler threads."""
+
+    def __init__(self, args):
+        self.books = args.books
+        self.first_id = args.first_id
+        self.layout = args.layout
+        self.latency = args.latency
+        self.jitter = args.jitter
+        self.error_rate = args.error_rate
+        self.throttle_rate = args.throttle_rate
+        self.rate_limit = args.rate_limit
+        self.retry_after = args.retry_after
+        self.bandwidth = args.bandwidth
+        self.fixtures = args.fixtures
+        self.base_url = ""  # filled in once the port is known
+        self.rng = random.Random(args.seed)
+        self.body = make_body(int(args.book_size * 1e6), args.seed)
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self._tokens = float(args.rate_limit or 0)
+        self._last_refill = time.monotonic()
+
+    def bump(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[key] += n
+
+    def roll(self, p: float) -> bool:
+        with self.lock:
+            return p > 0 and self.rng.random() < p
+
+    def take_token(self) -> bool:
+        """Token bucket for --rate-limit (requests/sec); False means throttle."""
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._last_refill) * self.rate_limit)
+            self._last_refill = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def route(self, path: str) -> Optional[bytes]:
+        """Return the response body for a path, or None for 404."""
+        if self.fixtures:
+            return self._fixture(path)
+        if path.rstrip("/") == "/browse/scores/top":
+            return scores_page(self.books, self.first_id, self.layout, self.base_url).encode("utf-8")
+        m = re.fullmatch(r"/ebooks/(\d+)", path)
+        if m and self._known(int(m.group(1))):
+            return book_page(int(m.group(1)), self.layout, self.base_url).encode("utf-8")
+        # Text is served where the crawler looks for it: the Plain Text link, and the
+        # /cache/epub fallback (the /files/... candidates 404 to exercise the fallback chain)
+        m = (re.fullmatch(r"/ebooks/(\d+)\.txt\.utf-8", path)
+             or re.fullmatch(r"/cache/epub/(\d+)/pg\1\.txt", path))
+        if m and self._known(int(m.group(1))):
+            return book_text(int(m.group(1)), self.body).encode("utf-8")
+        return None
+
+    def _known(self, book_id: int) -> bool:
+        return self.first_id <= book_id < self.first_id + self.books
+
+    def _fixture(self, path: str) -> Optional[bytes]:
+        root = os.path.abspath(self.fixtures)
+        local = os.path.abspath(os.path.join(root, path.lstrip("/") or "index.html"))
+        # commonpath, not a string prefix: fixtures-old/... must not pass as fixtures/...
+        if os.path.commonpath([local, root]) != root or not os.path.isfile(local):
+            return None
+        with open(local, "rb") as f:
+            data = f.read()
+        # Recorded pages point at the real site; rewrite absolute links to this server
+        return data.replace(b"https://www.gutenberg.org", self.base_url.encode("utf-8"))
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None  # set by make_server
+
+    def log_message(self, fmt, *args):
+        pass  # keep load-test output readable
+
+    def do_GET(self):
+        state = self.state
+        state.bump("requests")
+        delay = state.latency + (random.uniform(0, state.jitter) if state.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if not state.take_token() or state.roll(state.throttle_rate):
+            state.bump("throttled")
+            self._send_error(429, {"Retry-After": str(state.retry_after)})
+            return
+        if state.roll(state.error_rate):
+            state.bump("errors")
+            self._send_error(503)
+            return
+
+        body = state.route(urlparse(self.path).path)
+        if body is None:
+            state.bump("not_found")
+            self._send_error(404)
+            return
+
+        content_type = "text/plain; charset=utf-8" if self.path.endswith(".txt") or ".txt." in self.path \
+            else "text/html; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self._write_throttled(body)
+        state.bump("bytes", len(body))
+
+    def _send_error(self, code: int, headers: Optional[dict] = None) -> None:
+        body = f"<html><body><h1>{code}</h1></body></html>".encode("utf-8")
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_throttled(self, body: bytes) -> None:
+        """Write the body in chunks, sleeping to respect --bandwidth (bytes/sec per connection)."""
+        bandwidth = self.state.bandwidth
+        try:
+            for i in range(0, len(body), WRITE_CHUNK):
+                chunk = body[i:i + WRITE_CHUNK]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            self.state.bump("client_aborts")
+
+def make_server(args, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Build (but do not start) a stub server; port 0 picks a free port."""
+    state = StubState(args)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    state.base_url = f"http://{host}:{server.server_address[1]}"
+    server.state = state
+    return server
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared by `serve` and crawl_loadtest.py."""
+    parser.add_argument("--books", type=int, default=100, help="Books listed in the last-30-days section.")
+    parser.add_argument("--first-id", type=int, default=10001, help="Ebook number of the first listed book.")
+    parser.add_argument("--book-size", type=float, default=0.5, help="Size of each generated book in MB.")
+    parser.add_argument("--layout", choices=LAYOUTS, default="standard",
+                        help="Page layout variant, to test the crawler's parsing fallbacks.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed delay per request in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random delay (0..jitter s).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Requests/sec allowed before answering 429 (0 = unlimited).")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429.")
+    parser.add_argument("--bandwidth", type=float, default=0.0,
+                        help="Per-connection bandwidth cap in bytes/sec (0 = unlimited).")
+    parser.add_argument("--fixtures", type=str, default="",
+                        help="Serve a folder recorded with `record` instead of generated pages.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated text and fault injection.")
+
+# -----------------------------
+# Recording fixtures from the real site
+# -----------------------------
+
+def record(out_dir: str, n_books: int) -> None:
+    """Save the scores page, n_books book pages and their text files under out_dir."""
+    import crawl_and_download as crawler
+
+    def save(url: str, resp) -> None:
+        path = urlparse(url).path
+        local = os.path.join(out_dir, path.lstrip("/"))
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        with open(local, "wb") as f:
+            f.write(resp.content)
+        print(f"[INFO] Recorded {url} -> {local}")
+
+    resp = crawler.fetch(crawler.TOP_URL)
+    if not resp:
+        raise SystemExit("Failed to load top page.")
+    save(crawler.TOP_URL, resp)
+    for title, book_url in crawler.extract_last30_book_links(resp.text)[:n_books]:
+        page = crawler.fetch(book_url)
+        if not page:
+            continue
+        save(book_url, page)
+        txt_url = crawler.find_txt_download_url(page.text)
+        if txt_url and txt_url.startswith(crawler.BASE_URL):
+            txt = crawler.fetch(txt_url)
+            if txt:
+                save(txt_url, txt)
+        time.sleep(1)  # be polite
+
+# -----------------------------
+# Parser check against every layout
+# -----------------------------
+
+def expected_txt_url(base_url: str, book_id: int, layout: str) -> str:
+    """Where find_txt_download_url should end up for a stub book page."""
+    if layout == "no-plaintext-link":
+        return f"{base_url}/cache/epub/{book_id}/pg{book_id}.txt"  # first candidate the stub serves
+    return f"{base_url}/ebooks/{book_id}.txt.utf-8"
+
+def check_layouts(n_books: int = 3) -> int:
+    """
+    Run the crawler's extract_last30_book_links and find_txt_download_url against a stub
+    server in each layout of LAYOUTS. Prints one line per layout; returns the failure count.
+    """
+    import crawl_and_download as crawler
+
+    parser = argparse.ArgumentParser()
+    add_server_arguments(parser)
+    saved = (crawler.BASE_URL, crawler.MAX_RETRIES)
+    failures = 0
+    for layout in LAYOUTS:
+        args = parser.parse_args(["--books", str(n_books), "--book-size", "0.01", "--layout", layout])
+        server = make_server(args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = server.state.base_url
+        crawler.BASE_URL, crawler.MAX_RETRIES = base_url, 0  # candidate URLs are built from BASE_URL
+        problems = []
+        try:
+            links = crawler.extract_last30_book_links(crawler.fetch(f"{base_url}/browse/scores/top").text)
+            expected = [f"{base_url}/ebooks/{i}" for i in range(args.first_id, args.first_id + n_books)]
+            if [url for _, url in links] != expected:
+                problems.append(f"book links {[url for _, url in links]} != {expected}")
+            for book_id in range(args.first_id, args.first_id + n_books):
+                txt_url = crawler.find_txt_download_url(crawler.fetch(f"{base_url}/ebooks/{book_id}").text)
+                if txt_url != expected_txt_url(base_url, book_id, layout):
+                    problems.append(f"ebook {book_id}: text URL {txt_url}")
+        except Exception as e:
+            problems.append(f"{type(e).__name__}: {e}")
+        finally:
+            crawler.BASE_URL, crawler.MAX_RETRIES = saved
+            server.shutdown()
+            server.server_close()
+        failures += bool(problems)
+        print(f"[{'OK' if not problems else 'FAIL'}] layout={layout}" + "".join(f"\n  {p}" for p in problems))
+    return failures
+
+# -----------------------------
+# Main
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Project Gutenberg stand-in for offline crawler tests.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="Run the stub server until interrupted.")
+    p_serve.add_argument("--host", type=str, default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8000)
+    add_server_arguments(p_serve)
+
+    p_record = sub.add_parser("record", help="Record real gutenberg.org pages into a fixtures folder.")
+    p_record.add_argument("--out", type=str, default="fixtures/gutenberg")
+    p_record.add_argument("--books", type=int, default=5)
+
+    p_check = sub.add_parser("check-layouts",
+                             help="Check the crawler's page parsers against every layout (exit 1 on failure).")
+    p_check.add_argument("--books", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.out, args.books)
+        return
+    if args.command == "check-layouts":
+        if check_layouts(args.books):
+            sys.exit(1)
+        return
+
+    server = make_server(args, host=args.host, port=args.port)
+    print(f"[INFO] Serving stub Gutenberg at {server.state.base_url} "
+          f"(scores page: {server.state.base_url}/browse/scores/top)")
+    print(f"[INFO] Point the crawler at it via crawl_loadtest.py --url {server.state.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[INFO] Served: {dict(server.state.counters)}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
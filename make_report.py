@@ -5,15 +5,33 @@
 #  - Global Top-100 words
 #  - Methods (pipeline summary)
 #  - Reproducible Commands (your terminal steps, read from outputs/operations.md)
-
+#  - Optional: Zipf fit summary (--zipf) and pruned vocabulary (--pruned)
+# Each section is streamed straight into the report file from the stage outputs,
+# preferring the typed .npz companions (see columnar.py) and falling back to the CSVs
+# when an .npz is missing or older than its CSV.
+# Large tables (zipf_freqs, pruned_vocab_all) are only read for their summary values,
+# so with the .npz present report time does not grow with the vocabulary (the CSV
+# fallback streams the count column once).
+
+import argparse
 import os
 import datetime
-import pandas as pd
+
+from columnar import current_npz, iter_table, load_meta, npz_path_for
+from dedup import read_skipped_books
 
 OUTPUTS_DIR = "outputs"
 REPORT_PATH = os.path.join(OUTPUTS_DIR, "report.md")
 OPS_PATH = os.path.join(OUTPUTS_DIR, "operations.md")  # put your terminal steps here
 
+TOP20_CSV = os.path.join(OUTPUTS_DIR, "top20_books.csv")
+PERBOOK_CSV = os.path.join(OUTPUTS_DIR, "per_book_token_counts.csv")
+TOP100_CSV = os.path.join(OUTPUTS_DIR, "top100_words.csv")
+ZIPF_CSV = os.path.join(OUTPUTS_DIR, "zipf_freqs.csv")
+PRUNED_ALL_CSV = os.path.join(OUTPUTS_DIR, "pruned_vocab_all.csv")
+PRUNED_TOP_CSV = os.path.join(OUTPUTS_DIR, "pruned_top100.csv")
+DUP_CLUSTERS_CSV = os.path.join(OUTPUTS_DIR, "duplicate_clusters.csv")
+
 METHODS_TEXT = """\
 ## Methods
 
@@ -38,65 +56,135 @@ METHODS_TEXT = """\
    - For each book, record `total_tokens` and `unique_tokens` (`outputs/per_book_token_counts.csv`).
 """
 
-def main():
-    # --- Load data ---
-    top20_csv = os.path.join(OUTPUTS_DIR, "top20_books.csv")
-    perbook_csv = os.path.join(OUTPUTS_DIR, "per_book_token_counts.csv")
-    top100_csv = os.path.join(OUTPUTS_DIR, "top100_words.csv")
-
-    if not all(os.path.exists(p) for p in [top20_csv, perbook_csv, top100_csv]):
-        raise SystemExit("Missing CSVs. Run the crawling and cleaning scripts first.")
-
-    df_books = pd.read_csv(top20_csv)
-    df_stats = pd.read_csv(perbook_csv)
-    df_top100 = pd.read_csv(top100_csv)
-
-    # --- Start writing Markdown ---
-    lines = []
-    lines.append("# Project Gutenberg Top-20 Analysis\n")
-    lines.append(f"_Generated on: {datetime.datetime.now().isoformat(timespec='seconds')}_\n\n")
-    lines.append("This report summarizes the 20 most downloaded public-domain ebooks (last 30 days), the per-book token statistics, and the global Top-100 words.\n\n")
-
-    # Methods section
-    lines.append(METHODS_TEXT + "\n")
-
-    # Section: Books
-    lines.append("## Top-20 Books (Last 30 Days)\n")
-    for i, row in enumerate(df_books.itertuples(index=False), start=1):
-        lines.append(f"{i}. [{row.title}]({row.book_page})\n")
-    lines.append("\n")
-
-    # Section: Per-book stats
-    lines.append("## Token Statistics per Book\n")
-    lines.append("| Book | Unique Tokens | Total Tokens |\n")
-    lines.append("|------|---------------|--------------|\n")
-    for row in df_stats.itertuples(index=False):
-        lines.append(f"| {row.book} | {row.unique_tokens} | {row.total_tokens} |\n")
-    lines.append("\n")
-
-    # Section: Top-100 words
-    lines.append("## Global Top-100 Words\n")
-    lines.append("| Rank | Word | Count |\n")
-    lines.append("|------|------|-------|\n")
-    for row in df_top100.itertuples(index=False):
-        lines.append(f"| {row.rank} | {row.word} | {row.count} |\n")
-    lines.append("\n")
+def write_methods(out, clusters_csv: str) -> None:
+    skipped = read_skipped_books(clusters_csv)
+    if not skipped:
+        out.write(METHODS_TEXT + "\n")
+        return
+    out.write(METHODS_TEXT.replace("across all books", "across all books except duplicate editions"))
+    out.write(f"   - Near-duplicate editions (MinHash/LSH) left out of the global Counter, Zipf fit and pruned "
+              f"vocabulary ({len(skipped)}): {', '.join(skipped)}. See `{clusters_csv}`.\n")
+    out.write("\n")
+
+def write_books(out, top20_csv: str) -> None:
+    out.write("## Top-20 Books (Last 30 Days)\n")
+    for i, (title, book_page) in enumerate(iter_table(top20_csv, ["title", "book_page"]), start=1):
+        out.write(f"{i}. [{title}]({book_page})\n")
+    out.write("\n")
+
+def write_token_stats(out, perbook_csv: str) -> None:
+    out.write("## Token Statistics per Book\n")
+    out.write("| Book | Unique Tokens | Total Tokens |\n")
+    out.write("|------|---------------|--------------|\n")
+    for book, unique_tokens, total_tokens in iter_table(perbook_csv, ["book", "unique_tokens", "total_tokens"]):
+        out.write(f"| {book} | {unique_tokens} | {total_tokens} |\n")
+    out.write("\n")
+
+def write_word_table(out, title: str, csv_path: str, level: str = "##") -> None:
+    out.write(f"{level} {title}\n")
+    out.write("| Rank | Word | Count |\n")
+    out.write("|------|------|-------|\n")
+    for rank, word, count in iter_table(csv_path, ["rank", "word", "count"]):
+        out.write(f"| {rank} | {word} | {count} |\n")
+    out.write("\n")
+
+def has_table(csv_path: str) -> bool:
+    return os.path.exists(csv_path) or os.path.exists(npz_path_for(csv_path))
+
+def table_summary(csv_path: str) -> dict:
+    """
+    total_tokens/types of a word-count table: the .npz meta values if it is current, otherwise
+    one streaming pass over the CSV's count column (nothing else is kept in memory).
+    """
+    npz = current_npz(csv_path)
+    if npz:
+        return load_meta(npz)
+    total_tokens = types = 0
+    for (count,) in iter_table(csv_path, ["count"]):
+        total_tokens += int(count)
+        types += 1
+    return {"total_tokens": total_tokens, "types": types}
+
+def write_zipf(out, zipf_csv: str) -> bool:
+    # Summary only: totals and the fit are .npz meta values written by zipf_analysis.py
+    if not has_table(zipf_csv):
+        print(f"[WARN] {zipf_csv} not found; run zipf_analysis.py to add the Zipf section.")
+        return False
+    meta = table_summary(zipf_csv)
+    out.write("## Zipf's Law Fit\n")
+    out.write(f"- Tokens: {meta.get('total_tokens')}; vocabulary size (types): {meta.get('types')}\n")
+    if "a_fit" in meta:
+        out.write(f"- Fitted exponent on ranks {meta.get('rmin')}–{meta.get('rmax')}: "
+                  f"**a = {meta['a_fit']:.4f}** (log–log least squares)\n")
+    else:
+        print(f"[WARN] No current fit summary for {zipf_csv} (.npz missing or older than the CSV; "
+              f"rerun zipf_analysis.py); "
+              f"leaving out the fitted exponent.")
+    tables = [p for p in (zipf_csv, current_npz(zipf_csv)) if p and os.path.exists(p)]
+    out.write(f"- Full rank table: {' / '.join(f'`{p}`' for p in tables)}\n\n")
+    for png, caption in (("zipf_rank_freq.png", "Empirical rank–frequency"),
+                         ("zipf_overlay.png", "Empirical vs. Zipf models")):
+        if os.path.exists(os.path.join(OUTPUTS_DIR, png)):
+            out.write(f"![{caption}]({png})\n\n")
+    return True
+
+def write_pruned(out, all_csv: str, top_csv: str) -> bool:
+    if not has_table(all_csv) or not has_table(top_csv):
+        print(f"[WARN] {all_csv} / {top_csv} not found; run prune_vocab.py to add the pruned-vocabulary section.")
+        return False
+    meta = table_summary(all_csv)
+    out.write("## Pruned Vocabulary\n")
+    if "min_len" in meta:
+        out.write(f"- Stopwords removed; words shorter than {meta.get('min_len')} or longer than "
+                  f"{meta.get('max_len')} characters removed; top {100 * meta.get('top_pct_drop', 0):g}% most "
+                  f"frequent words removed; words with count < {meta.get('min_count')} removed.\n")
+    else:
+        # the CSV does not record the pruning settings
+        out.write("- Stopwords, very short/long, most frequent and rare words removed (see `prune_vocab.py`).\n")
+    out.write(f"- Remaining types: {meta.get('types')}; tokens: {meta.get('total_tokens')}\n\n")
+    write_word_table(out, "Pruned Top-100 Words", top_csv, level="###")
+    return True
 
+def write_operations(out) -> None:
     # Section: Reproducible commands (optional)
     if os.path.exists(OPS_PATH):
         with open(OPS_PATH, "r", encoding="utf-8") as f:
             ops_text = f.read().strip()
         if ops_text:
-            lines.append("## Reproducible Commands\n")
-            lines.append("The following shell commands document the exact steps executed on the machine:\n\n")
-            lines.append("```bash\n")
-            lines.append(ops_text + "\n")
-            lines.append("```\n")
+            out.write("## Reproducible Commands\n")
+            out.write("The following shell commands document the exact steps executed on the machine:\n\n")
+            out.write("```bash\n")
+            out.write(ops_text + "\n")
+            out.write("```\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate outputs/report.md from the pipeline outputs.")
+    parser.add_argument("--zipf", action="store_true", help="Add the Zipf fit section (needs zipf_analysis.py).")
+    parser.add_argument("--pruned", action="store_true", help="Add the pruned-vocabulary section (needs prune_vocab.py).")
+    args = parser.parse_args()
+
+    required = [TOP20_CSV, PERBOOK_CSV, TOP100_CSV]
+    if not all(has_table(p) for p in required):
+        raise SystemExit("Missing CSVs. Run the crawling and cleaning scripts first.")
 
-    # Write file
+    # --- Stream Markdown sections straight to disk ---
     os.makedirs(OUTPUTS_DIR, exist_ok=True)
-    with open(REPORT_PATH, "w", encoding="utf-8") as f:
-        f.writelines(lines)
+    with open(REPORT_PATH, "w", encoding="utf-8") as out:
+        out.write("# Project Gutenberg Top-20 Analysis\n")
+        out.write(f"_Generated on: {datetime.datetime.now().isoformat(timespec='seconds')}_\n\n")
+        out.write("This report summarizes the 20 most downloaded public-domain ebooks (last 30 days), the per-book token statistics, and the global Top-100 words.\n\n")
+
+        # Methods section
+        write_methods(out, DUP_CLUSTERS_CSV)
+
+        write_books(out, TOP20_CSV)
+        write_token_stats(out, PERBOOK_CSV)
+        write_word_table(out, "Global Top-100 Words", TOP100_CSV)
+        if args.zipf:
+            write_zipf(out, ZIPF_CSV)
+        if args.pruned:
+            write_pruned(out, PRUNED_ALL_CSV, PRUNED_TOP_CSV)
+        write_operations(out)
 
     print(f"[INFO] Markdown report generated: {REPORT_PATH}")
     if os.path.exists(OPS_PATH):
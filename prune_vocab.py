@@ -8,6 +8,12 @@ import glob
 import csv
 from collections import Counter
 
+import numpy as np
+
+from columnar import npz_path_for, save_columns
+from compressed_io import is_text_file, iter_text_chunks, one_per_variant
+from dedup import clean_book_name, read_skipped_books
+
 # ---- Configs (can be overridden by env vars if you like) ----
 CLEAN_DIR     = os.environ.get("CLEAN_DIR", "data/clean")
 OUT_DIR       = os.environ.get("OUT_DIR", "outputs")
@@ -15,6 +21,8 @@ MIN_LEN       = int(os.environ.get("MIN_LEN", 3))   # overly short threshold
 MAX_LEN       = int(os.environ.get("MAX_LEN", 20))  # overly long threshold
 MIN_COUNT     = int(os.environ.get("MIN_COUNT", 4)) # drop words occurring < 4
 TOP_PCT_DROP  = float(os.environ.get("TOP_PCT_DROP", 0.01))  # drop top 1%
+# books marked counted=0 here (duplicate editions) are left out; "" reads every book
+DUP_CLUSTERS_CSV = os.environ.get("DUP_CLUSTERS_CSV", os.path.join(OUT_DIR, "duplicate_clusters.csv"))
 
 # ---- Stopwords (NLTK) ----
 try:
@@ -30,18 +38,20 @@ except Exception:
 
 TOKEN_RE = re.compile(r"[a-z]+")
 
-def read_clean_tokens(clean_dir: str) -> Counter:
+def read_clean_tokens(clean_dir: str, skip=()) -> Counter:
     counter = Counter()
-    files = sorted(glob.glob(os.path.join(clean_dir, "*.txt")))
+    files = one_per_variant(sorted(fp for fp in glob.glob(os.path.join(clean_dir, "*.txt*")) if is_text_file(fp)))
     if not files:
         raise FileNotFoundError(f"No cleaned files found under {clean_dir}/. "
                                 "Run clean_and_vocab.py first.")
     for fp in files:
-        with open(fp, "r", encoding="utf-8", errors="ignore") as f:
-            text = f.read().lower()
-        # robust extraction (even if files are not whitespace-tokenized)
-        toks = TOKEN_RE.findall(text)
-        counter.update(toks)
+        if clean_book_name(fp) in skip:
+            print(f"[INFO] Skipping duplicate edition: {os.path.basename(fp)}")
+            continue
+        # stream plain or compressed files in whitespace-aligned chunks
+        for chunk in iter_text_chunks(fp):
+            # robust extraction (even if files are not whitespace-tokenized)
+            counter.update(TOKEN_RE.findall(chunk.lower()))
     return counter
 
 def prune(counter: Counter) -> Counter:
@@ -78,28 +88,39 @@ def prune(counter: Counter) -> Counter:
 def export_all(counter: Counter, out_dir: str):
     os.makedirs(out_dir, exist_ok=True)
     all_path = os.path.join(out_dir, "pruned_vocab_all.csv")
+    items = counter.most_common()
     with open(all_path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["word", "count"])
-        for word, cnt in counter.most_common():
-            w.writerow([word, cnt])
-    print(f"[INFO] Saved all pruned vocab -> {all_path}")
+        w.writerows(items)
+    counts = np.array([c for _, c in items], dtype=np.int64)
+    save_columns(npz_path_for(all_path), {"word": [word for word, _ in items], "count": counts},
+                 meta={"types": len(items), "total_tokens": int(counts.sum()),
+                       "min_len": MIN_LEN, "max_len": MAX_LEN, "min_count": MIN_COUNT,
+                       "top_pct_drop": TOP_PCT_DROP})
+    print(f"[INFO] Saved all pruned vocab -> {all_path} (+ .npz)")
     return all_path
 
 def export_top100(counter: Counter, out_dir: str):
     os.makedirs(out_dir, exist_ok=True)
     top_path = os.path.join(out_dir, "pruned_top100.csv")
+    top100 = counter.most_common(100)
     with open(top_path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["rank", "word", "count"])
-        for i, (word, cnt) in enumerate(counter.most_common(100), start=1):
+        for i, (word, cnt) in enumerate(top100, start=1):
             w.writerow([i, word, cnt])
-    print(f"[INFO] Saved pruned top-100 -> {top_path}")
+    save_columns(npz_path_for(top_path), {
+        "rank": np.arange(1, len(top100) + 1, dtype=np.int64),
+        "word": [word for word, _ in top100],
+        "count": np.array([cnt for _, cnt in top100], dtype=np.int64),
+    })
+    print(f"[INFO] Saved pruned top-100 -> {top_path} (+ .npz)")
     return top_path
 
 def main():
     print("[INFO] Reading cleaned tokens ...")
-    counts = read_clean_tokens(CLEAN_DIR)
+    counts = read_clean_tokens(CLEAN_DIR, skip=set(read_skipped_books(DUP_CLUSTERS_CSV)))
 
     print("[INFO] Pruning vocabulary ...")
     pruned = prune(counts)
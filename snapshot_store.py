@@ -0,0 +1,271 @@
+# snapshot_store.py
+# Purpose: Keep every crawl's vocabulary so months can be compared without rerunning
+# the pipeline on archived copies. Layout under SNAPSHOT_DIR (default data/snapshots):
+#   books/<book_id>.npz   per-book word counts + MinHash signature (written once per book,
+#                         reused by clean_and_vocab.py when the book shows up again)
+#   <crawl_date>.npz      one run: ranked book list with token stats, plus the aggregated
+#                         global word counts used for queries
+# All files are written with columnar.save_columns: compressed NumPy archives with typed
+# columns, strings as a UTF-8 buffer + offsets, scalars (e.g. the fingerprint) as meta.
+#
+#   python snapshot_store.py list
+#   python snapshot_store.py compare --old 2026-09-19 --new 2026-10-19 --top 100
+#   python snapshot_store.py zipf --rmin 10 --rmax 3000
+
+import argparse
+import csv
+import datetime
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from columnar import load_columns, load_meta, save_columns
+from compressed_io import strip_text_suffix
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "data/snapshots")
+BOOK_SCHEMA_VERSION = 3  # bump when the layout of books/<id>.npz changes
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# -----------------------------
+# Book index (raw file name -> Gutenberg ebook number)
+# -----------------------------
+
+def read_book_index(top_csv: str) -> Dict[str, dict]:
+    """
+    Map each downloaded book's name (raw file name without .txt/.gz/.xz) to
+    {book_id, title, rank}, using the crawler's CSV. The ebook number from the book
+    page URL is the stable key; rank is the position in the crawled list.
+    """
+    index = {}
+    if not os.path.exists(top_csv):
+        return index
+    with open(top_csv, newline="", encoding="utf-8") as f:
+        for rank, row in enumerate(csv.DictReader(f), start=1):
+            if not row.get("local_path"):
+                continue
+            m = re.search(r"/ebooks/(\d+)", row.get("book_page", ""))
+            name = strip_text_suffix(row["local_path"])
+            index[name] = {"book_id": m.group(1) if m else name, "title": row.get("title", name), "rank": rank}
+    return index
+
+def crawl_date_of(top_csv: str) -> str:
+    """CRAWL_DATE env var, else the date the crawler wrote its CSV, else today."""
+    date = os.environ.get("CRAWL_DATE", "")
+    if date:
+        if not DATE_RE.match(date):
+            raise ValueError(f"CRAWL_DATE must look like YYYY-MM-DD, got {date!r}")
+        return date
+    if os.path.exists(top_csv):
+        return datetime.date.fromtimestamp(os.path.getmtime(top_csv)).isoformat()
+    return datetime.date.today().isoformat()
+
+# -----------------------------
+# Per-book counts
+# -----------------------------
+
+def counter_to_arrays(counter: Counter) -> Tuple[List[str], np.ndarray]:
+    """Words and counts, most frequent first."""
+    items = counter.most_common()
+    words = [w for w, _ in items]
+    counts = np.array([c for _, c in items], dtype=np.int64)
+    return words, counts
+
+def arrays_to_counter(words, counts: np.ndarray) -> Counter:
+    return Counter(dict(zip(_as_list(words), counts.tolist())))
+
+def _as_list(values) -> list:
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+def _book_path(store_dir: str, book_id: str) -> str:
+    return os.path.join(store_dir, "books", f"{book_id}.npz")
+
+def _full_fingerprint(fingerprint: str) -> str:
+    return f"schema={BOOK_SCHEMA_VERSION};{fingerprint}"
+
+def save_book(store_dir: str, book_id: str, counter: Counter, signature: np.ndarray, fingerprint: str,
+              raw_sha1: str) -> None:
+    """
+    fingerprint identifies the pipeline (settings + code) that produced the counts,
+    raw_sha1 the downloaded text they were computed from (compressed_io.text_sha1).
+    """
+    os.makedirs(os.path.join(store_dir, "books"), exist_ok=True)
+    words, counts = counter_to_arrays(counter)
+    save_columns(_book_path(store_dir, book_id),
+                 {"word": words, "count": counts, "signature": np.asarray(signature, dtype=np.uint32)},
+                 meta={"fingerprint": _full_fingerprint(fingerprint), "raw_sha1": raw_sha1})
+
+def load_book(store_dir: str, book_id: str, fingerprint: str, raw_sha1: str) -> Optional[Tuple[Counter, np.ndarray]]:
+    """
+    (counts, MinHash signature) of a book stored by an earlier run, or None if there is
+    none, it was produced by a different pipeline fingerprint / schema version, or the
+    raw text has changed since (e.g. Gutenberg revised the ebook under the same number).
+    """
+    path = _book_path(store_dir, book_id)
+    if not os.path.exists(path):
+        return None
+    meta = load_meta(path)
+    if meta.get("fingerprint", "") != _full_fingerprint(fingerprint):
+        print(f"[INFO] Stored counts for ebook {book_id} come from different pipeline settings; recomputing.")
+        return None
+    if meta.get("raw_sha1", "") != raw_sha1:
+        print(f"[INFO] Text of ebook {book_id} changed since its counts were stored; recomputing.")
+        return None
+    cols = load_columns(path, ["word", "count", "signature"])
+    return arrays_to_counter(cols["word"], cols["count"]), cols["signature"]
+
+# -----------------------------
+# Snapshots (one per crawl date)
+# -----------------------------
+
+# Per-book columns (one row per ranked book) and the global vocabulary columns (one row per word)
+BOOK_COLUMNS = ["book_id", "title", "rank", "unique_tokens", "total_tokens", "counted"]
+VOCAB_COLUMNS = ["words", "counts"]
+
+def save_snapshot(store_dir: str, date: str, books: List[dict], global_vocab: Counter) -> str:
+    """
+    books: rows with book_id, title, rank, unique_tokens, total_tokens, counted (0/1: part of
+    global_vocab, i.e. not skipped as a duplicate edition). Rewrites the snapshot for that date.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    words, counts = counter_to_arrays(global_vocab)
+    path = os.path.join(store_dir, f"{date}.npz")
+    save_columns(path, {
+        "book_id": [str(b["book_id"]) for b in books],
+        "title": [b["title"] for b in books],
+        "rank": np.array([b["rank"] for b in books], dtype=np.int32),
+        "unique_tokens": np.array([b["unique_tokens"] for b in books], dtype=np.int64),
+        "total_tokens": np.array([b["total_tokens"] for b in books], dtype=np.int64),
+        "counted": np.array([b.get("counted", 1) for b in books], dtype=np.int8),
+        "words": words,
+        "counts": counts,
+    })
+    return path
+
+def list_snapshots(store_dir: str) -> List[str]:
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(fn[:-4] for fn in os.listdir(store_dir) if fn.endswith(".npz") and DATE_RE.match(fn[:-4]))
+
+def load_snapshot(store_dir: str, date: str) -> Dict[str, object]:
+    """Snapshot columns: str columns (book_id, title, words) as lists, numeric ones as arrays."""
+    path = os.path.join(store_dir, f"{date}.npz")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No snapshot for {date} under {store_dir} (have: {list_snapshots(store_dir)})")
+    cols = load_columns(path, BOOK_COLUMNS + VOCAB_COLUMNS)
+    for name in ("book_id", "title", "words"):
+        cols[name] = _as_list(cols[name])
+    return cols
+
+# -----------------------------
+# Queries
+# -----------------------------
+
+def compare_snapshots(old: Dict[str, object], new: Dict[str, object], top: int):
+    """
+    Rank changes for the new snapshot's top words, plus words that appear only in one
+    of the two snapshots. Ranks are 1-based positions in each snapshot's count order.
+    Returns (rank_rows, new_words, dropped_words); the word lists are most frequent first.
+    """
+    old_rank = {w: i for i, w in enumerate(old["words"], start=1)}
+    new_rank = {w: i for i, w in enumerate(new["words"], start=1)}
+
+    rank_rows = []
+    for w, c in zip(new["words"][:top], new["counts"][:top].tolist()):
+        r_new, r_old = new_rank[w], old_rank.get(w)
+        rank_rows.append({"word": w, "count": c, "rank": r_new,
+                          "prev_rank": r_old if r_old else "",
+                          "change": (r_old - r_new) if r_old else "new"})
+
+    new_words = [(w, c) for w, c in zip(new["words"], new["counts"].tolist()) if w not in old_rank]
+    dropped_words = [(w, c) for w, c in zip(old["words"], old["counts"].tolist()) if w not in new_rank]
+    return rank_rows, new_words, dropped_words
+
+def zipf_exponent(snapshot: Dict[str, object], rmin: int, rmax: int) -> float:
+    # Same log-log least-squares fit as zipf_analysis.py, on the stored (already sorted) counts
+    from zipf_analysis import fit_zipf_exponent
+    counts = snapshot["counts"].astype(np.float64)
+    probs = counts / counts.sum()
+    ranks = np.arange(1, len(counts) + 1, dtype=np.int64)
+    a_fit, _ = fit_zipf_exponent(ranks, probs, rmin, rmax)
+    return a_fit
+
+# -----------------------------
+# Main
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Query vocabulary snapshots across crawl dates.")
+    parser.add_argument("--store", type=str, default=SNAPSHOT_DIR, help="Snapshot directory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="List stored snapshots with book and token totals.")
+
+    p_cmp = sub.add_parser("compare", help="Rank changes and new/dropped words between two snapshots.")
+    p_cmp.add_argument("--old", type=str, default="", help="Older crawl date (default: second latest).")
+    p_cmp.add_argument("--new", type=str, default="", help="Newer crawl date (default: latest).")
+    p_cmp.add_argument("--top", type=int, default=100, help="How many top words to track.")
+    p_cmp.add_argument("--show", type=int, default=20, help="New/dropped words to print.")
+    p_cmp.add_argument("--out", type=str, default="",
+                       help="CSV for rank changes (default: outputs/rank_changes_<old>_<new>.csv).")
+
+    p_zipf = sub.add_parser("zipf", help="Fitted Zipf exponent for every snapshot.")
+    p_zipf.add_argument("--rmin", type=int, default=10, help="Lower rank bound for fitting (inclusive).")
+    p_zipf.add_argument("--rmax", type=int, default=3000, help="Upper rank bound for fitting (inclusive).")
+
+    args = parser.parse_args()
+    dates = list_snapshots(args.store)
+    if not dates:
+        raise SystemExit(f"No snapshots under {args.store}. Run clean_and_vocab.py first.")
+
+    if args.command == "list":
+        for date in dates:
+            snap = load_snapshot(args.store, date)
+            print(f"{date}  books={len(snap['book_id']):>4}  counted={int(snap['counted'].sum()):>4}  "
+                  f"tokens={int(snap['counts'].sum()):>10}  types={len(snap['words']):>7}")
+
+    elif args.command == "compare":
+        new_date = args.new or dates[-1]
+        older = [d for d in dates if d < new_date]
+        old_date = args.old or (older[-1] if older else "")
+        if not old_date:
+            raise SystemExit(f"No snapshot older than {new_date} to compare with.")
+        old, new = load_snapshot(args.store, old_date), load_snapshot(args.store, new_date)
+        rank_rows, new_words, dropped_words = compare_snapshots(old, new, args.top)
+
+        out = args.out or os.path.join("outputs", f"rank_changes_{old_date}_{new_date}.csv")
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        with open(out, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["rank", "word", "count", "prev_rank", "change"])
+            writer.writeheader()
+            writer.writerows(rank_rows)
+
+        old_books, new_books = set(old["book_id"]), set(new["book_id"])
+        print(f"[INFO] {old_date} -> {new_date}: {len(new_books - old_books)} books entered, "
+              f"{len(old_books - new_books)} left the list")
+        print(f"[INFO] Top-{args.top} rank changes -> {out}")
+        for row in rank_rows[:args.show]:
+            print(f"  {row['rank']:>4}. {row['word']:<15} {row['count']:>8}  (was {row['prev_rank'] or '-'}, "
+                  f"{row['change']})")
+        print(f"[INFO] New words: {len(new_words)}  e.g. {', '.join(w for w, _ in new_words[:args.show])}")
+        print(f"[INFO] Dropped words: {len(dropped_words)}  e.g. {', '.join(w for w, _ in dropped_words[:args.show])}")
+
+    elif args.command == "zipf":
+        print(f"{'crawl_date':<12} {'tokens':>10} {'types':>8} {'a_fit':>7}")
+        for date in dates:
+            snap = load_snapshot(args.store, date)
+            try:
+                a_txt = f"{zipf_exponent(snap, args.rmin, args.rmax):>7.4f}"
+            except ValueError:
+                a_txt = f"{'-':>7}"  # too few types in [rmin, rmax] for this crawl
+            print(f"{date:<12} {int(snap['counts'].sum()):>10} {len(snap['words']):>8} {a_txt}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
@@ -17,30 +17,36 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from columnar import save_columns
+from compressed_io import is_text_file, iter_text_chunks, one_per_variant
+from dedup import clean_book_name, read_skipped_books
+
 
 # -----------------------------
 # Utility functions
 # -----------------------------
 
-def read_clean_tokens(clean_dir: Path) -> Counter:
-    # Read all cleaned .txt files and accumulate token counts.
+def read_clean_tokens(clean_dir: Path, skip=()) -> Counter:
+    # Read all cleaned .txt (or .txt.gz / .txt.xz) files and accumulate token counts.
     # Cleaned files were written by clean_and_vocab.py (space-separated lemmas).
+    # skip: book names left out (duplicate editions not counted by clean_and_vocab.py).
     counter = Counter()
     if not clean_dir.exists():
         raise FileNotFoundError(f"Clean directory not found: {clean_dir}")
 
-    files = sorted([p for p in clean_dir.glob("*.txt") if p.is_file()])
+    files = one_per_variant(sorted([p for p in clean_dir.iterdir() if p.is_file() and is_text_file(p.name)]))
     if not files:
         raise RuntimeError(f"No cleaned .txt files found in: {clean_dir}. "
                            f"Run clean_and_vocab.py first.")
 
     for fp in files:
-        # NOTE: each file is a long space-separated string of tokens
-        with fp.open("r", encoding="utf-8", errors="ignore") as f:
-            text = f.read()
-        # Split by whitespace and update global counter
-        tokens = text.split()
-        counter.update(tokens)
+        if clean_book_name(fp) in skip:
+            print(f"[INFO] Skipping duplicate edition: {fp.name}")
+            continue
+        # NOTE: each file is a long space-separated string of tokens; stream it in
+        # whitespace-aligned chunks instead of loading the whole book at once
+        for chunk in iter_text_chunks(fp):
+            counter.update(chunk.split())
 
     return counter
 
@@ -68,6 +74,16 @@ def save_rank_table(out_csv: Path, ranks: np.ndarray, words: list, counts: np.nd
         "prob": probs
     })
     df.to_csv(out_csv, index=False)
+    # An .npz left by an earlier run would describe a different table; drop it until the fit succeeds
+    out_csv.with_suffix(".npz").unlink(missing_ok=True)
+
+
+def save_rank_npz(out_csv: Path, ranks: np.ndarray, words: list, counts: np.ndarray, probs: np.ndarray,
+                  meta: dict) -> None:
+    # Typed .npz next to the CSV, with the fit summary (a_fit, window) as meta for make_report.py.
+    save_columns(str(out_csv.with_suffix(".npz")),
+                 {"rank": ranks, "word": words, "count": counts, "prob": probs},
+                 meta={"total_tokens": int(counts.sum()), "types": len(words), **meta})
 
 
 def fit_zipf_exponent(ranks: np.ndarray, probs: np.ndarray, rmin: int, rmax: int) -> Tuple[float, float]:
@@ -170,6 +186,9 @@ def main():
                         help="Lower rank bound for fitting (inclusive).")
     parser.add_argument("--rmax", type=int, default=3000,
                         help="Upper rank bound for fitting (inclusive).")
+    parser.add_argument("--dup-clusters", type=str, default=os.path.join("outputs", "duplicate_clusters.csv"),
+                        help="Cluster report from clean_and_vocab.py; books with counted=0 are left out "
+                             "('' to use every book).")
     args = parser.parse_args()
 
     clean_dir = Path(args.clean_dir)
@@ -178,7 +197,7 @@ def main():
 
     # 1) Read cleaned tokens & aggregate counts
     print("[INFO] Reading cleaned tokens ...")
-    counter = read_clean_tokens(clean_dir)
+    counter = read_clean_tokens(clean_dir, skip=set(read_skipped_books(args.dup_clusters)))
 
     # 2) Build rank-frequency & save table
     print("[INFO] Building rank–frequency table ...")
@@ -200,6 +219,11 @@ def main():
     print(f"[INFO] Saved overlay -> {overlay_png}")
     print(f"[INFO] Fitted exponent a (window {args.rmin}-{args.rmax}): a = {a_fit:.4f}")
 
+    # 5) Save the typed table with the fit summary
+    save_rank_npz(out_csv, ranks, words, counts, probs,
+                  meta={"a_fit": float(a_fit), "rmin": args.rmin, "rmax": args.rmax})
+    print(f"[INFO] Saved rank table + fit summary -> {out_csv.with_suffix('.npz')}")
+
 
 if __name__ == "__main__":
     try: